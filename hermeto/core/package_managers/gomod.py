@@ -1,15 +1,18 @@
 import logging
 import os
+import posixpath
 import re
 import shutil
 import subprocess
+import sys
 import tempfile
+import threading
 from collections import UserDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from functools import cached_property
+from functools import cached_property, lru_cache
 from itertools import chain
 from pathlib import Path
-from types import TracebackType
 from typing import (
     TYPE_CHECKING,
     Any,
@@ -20,7 +23,6 @@ from typing import (
     NoReturn,
     Optional,
     Tuple,
-    Type,
     Union,
 )
 
@@ -56,6 +58,33 @@ VENDORING_DOC = f"{GOMOD_DOC}#vendoring"
 
 ModuleDict = dict[str, Any]
 
+# The beginning of a "vX.Y.Z" version tag (after stripping the subpath prefix, if any)
+_TAG_MAJOR_VERSION_RE = re.compile(r"v(?P<major>\d+)\.")
+
+# A "X.Y.Z" semantic version without pre-release and build metadata (the usual tag format)
+_SEMVER_CORE_RE = re.compile(r"(0|[1-9]\d*)\.(0|[1-9]\d*)\.(0|[1-9]\d*)")
+
+# The "/vN" major version suffix of a module path
+_MODULE_MAJOR_VERSION_RE = re.compile(r"(?:.+/v)(?P<major_version>\d+)$")
+
+# packaging.version requires passing the re.VERBOSE|re.IGNORECASE flags [1]
+# [1] https://packaging.pypa.io/en/latest/version.html#packaging.version.VERSION_PATTERN
+_GO_RELEASE_RE = re.compile(f"go{version.VERSION_PATTERN}", re.VERBOSE | re.IGNORECASE)
+
+# The 'go' and 'toolchain' directives of a go.mod file. These need to be able to handle arbitrary
+# pre-release version identifiers and commentaries as well, since Go itself can parse them
+# - 'go 1.21.0'
+# - '   go 1.21.0rc4'
+# - 'go 1.21beta1//commentary'
+_GOMOD_VERSION_STR_REGEX = r"(?P<ver>\d+\.\d+(:?\.\d+)?(?:[a-zA-Z]+\d+)?)"
+_GOMOD_POST_VERSION_CHARS_REGEX = r"\s*(?:\/\/.*)?"
+_GOMOD_GO_DIRECTIVE_RE = re.compile(
+    rf"^\s*go\s+{_GOMOD_VERSION_STR_REGEX}{_GOMOD_POST_VERSION_CHARS_REGEX}$"
+)
+_GOMOD_TOOLCHAIN_DIRECTIVE_RE = re.compile(
+    rf"^\s*toolchain\s+go{_GOMOD_VERSION_STR_REGEX}{_GOMOD_POST_VERSION_CHARS_REGEX}$"
+)
+
 
 class _ParsedModel(pydantic.BaseModel):
     """Attributes automatically get PascalCase aliases to make parsing Golang JSON easier.
@@ -86,6 +115,11 @@ class ParsedModule(_ParsedModel):
     main: bool = False
     replace: Optional["ParsedModule"] = None
 
+    @pydantic.field_validator("path", "version")
+    def _intern(cls, value: Optional[str]) -> Optional[str]:
+        """Intern the module paths and versions, the same ones repeat across every package."""
+        return sys.intern(value) if value is not None else None
+
 
 class ParsedPackage(_ParsedModel):
     """A Go package as returned by the -json option of go list (relevant fields only).
@@ -98,6 +132,11 @@ class ParsedPackage(_ParsedModel):
     standard: bool = False
     module: Optional[ParsedModule] = None
 
+    @pydantic.field_validator("import_path")
+    def _intern(cls, import_path: str) -> str:
+        """Intern the import paths, the same ones repeat across every subpath's go list output."""
+        return sys.intern(import_path)
+
 
 class _GoWorkUseStruct(_ParsedModel):
     disk_path: str
@@ -237,6 +276,9 @@ class Go:
     parses various Go files, etc.
     """
 
+    # modules may be resolved concurrently, make sure a toolchain only gets installed once
+    _install_lock = threading.Lock()
+
     def __init__(
         self,
         binary: Union[str, os.PathLike[str]] = "go",
@@ -259,7 +301,9 @@ class Go:
             if bin_ := self._locate_toolchain(self._release):
                 self._bin = bin_
             else:
-                log.debug(f"Desired toolchain '{self._release}' not found, will download it lazily")
+                log.debug(
+                    "Desired toolchain '%s' not found, will download it lazily", self._release
+                )
                 self._install_toolchain = True
 
     def __call__(self, cmd: list[str], params: Optional[dict] = None, retry: bool = False) -> str:
@@ -275,7 +319,9 @@ class Go:
 
         # we check both values to silence the type checker complaining self._release might be None
         if self._install_toolchain and self._release:
-            self._bin = self._install(self._release)
+            with self._install_lock:
+                # another thread may have installed the same toolchain in the meantime
+                self._bin = self._locate_toolchain(self._release) or self._install(self._release)
             self._install_toolchain = False
 
         cmd = [self._bin] + cmd
@@ -297,12 +343,8 @@ class Go:
         # lazy evaluation: defer running 'go'
         if not self._release:
             output = self(["version"])
-            log.debug(f"Go release: {output}")
-            release_pattern = f"go{version.VERSION_PATTERN}"
-
-            # packaging.version requires passing the re.VERBOSE|re.IGNORECASE flags [1]
-            # [1] https://packaging.pypa.io/en/latest/version.html#packaging.version.VERSION_PATTERN
-            if match := re.search(release_pattern, output, re.VERBOSE | re.IGNORECASE):
+            log.debug("Go release: %s", output)
+            if match := _GO_RELEASE_RE.search(output):
                 self._release = match.group(0)
             else:
                 # This should not happen, otherwise we must figure out a more reliable way of
@@ -326,7 +368,7 @@ class Go:
         for p in [Path("/usr/local/", go_path_stub), Path(local_cache, go_path_stub)]:
             status = "SUCCESS" if p.exists() else "FAIL"
 
-            log.debug(f"Trying to locate Go toolchain at '{p}': {status}")
+            log.debug("Trying to locate Go toolchain at '%s': %s", p, status)
             if p.exists():
                 return str(p)
 
@@ -361,7 +403,7 @@ class Go:
         # Go would download the shim to $HOME too, but unlike 'go download' we can at least adjust
         # 'go install' to point elsewhere using $GOPATH
         with tempfile.TemporaryDirectory(prefix=f"{APP_NAME}", suffix="go-download") as td:
-            log.debug(f"Installing Go {release} toolchain shim from '{url}'")
+            log.debug("Installing Go %s toolchain shim from '%s'", release, url)
             env = {
                 "PATH": os.environ.get("PATH", ""),
                 "GOPATH": td,
@@ -369,7 +411,7 @@ class Go:
             }
             self._retry([self._bin, "install", url], env=env)
 
-            log.debug(f"Downloading Go {release} SDK")
+            log.debug("Downloading Go %s SDK", release)
             self._retry([f"{td}/bin/{release}", "download"], env=env)
 
             # move the newly downloaded SDK from $HOME/sdk to $HOME/.cache/hermeto/go
@@ -377,7 +419,7 @@ class Go:
             go_dest_dir = get_cache_dir() / "go" / release
             shutil.move(sdk_download_dir, go_dest_dir)
 
-        log.debug(f"Go {release} toolchain installed at: {go_dest_dir}")
+        log.debug("Go %s toolchain installed at: %s", release, go_dest_dir)
         return str(go_dest_dir / "bin/go")
 
     def _retry(self, cmd: list[str], **kwargs: Any) -> str:
@@ -413,7 +455,7 @@ class Go:
 
     def _run(self, cmd: list[str], **kwargs: Any) -> str:
         try:
-            log.debug(f"Running '{cmd}'")
+            log.debug("Running '%s'", cmd)
             return run_cmd(cmd, kwargs)
         except subprocess.CalledProcessError as e:
             rc = e.returncode
@@ -575,10 +617,8 @@ def _create_modules_from_parsed_data(
             # Should not happen, this function will only be called for replaced modules
             raise RuntimeError("Can't resolve path for a module that was not replaced")
 
-        path = f"{main_module.real_path}/{module.replace.path}"
-
-        platform_specific_path = os.path.normpath(path)
-        return Path(platform_specific_path).as_posix()
+        # module paths always use forward slashes, no need for the platform specific os.path
+        return posixpath.normpath(f"{main_module.real_path}/{module.replace.path}")
 
     return [_create_module(module) for module in parsed_modules]
 
@@ -588,6 +628,8 @@ def _create_packages_from_parsed_data(
 ) -> list[Union[Package, StandardPackage]]:
     # in case of replacements, the packages still refer to their parent module by its original name
     indexed_modules = {module.original_name: module for module in modules}
+    # import path prefixes already matched to their parent module, see _find_parent_module_by_name
+    modules_by_prefix = indexed_modules.copy()
 
     def _create_package(package: ParsedPackage) -> Union[Package, StandardPackage]:
         if package.standard:
@@ -604,26 +646,37 @@ def _create_packages_from_parsed_data(
 
     def _find_parent_module_by_name(package: ParsedPackage) -> Module:
         """Return the longest module name that is contained in package's import_path."""
-        path = Path(package.import_path)
-
-        matched_name = max(
-            filter(path.is_relative_to, indexed_modules.keys()),
-            key=len,  # type: ignore
-            default=None,
-        )
-
-        if not matched_name:
-            # This should be impossible
-            raise RuntimeError("Package parent module was not found")
-
-        return indexed_modules[matched_name]
+        # walk the import path prefixes from the longest to the shortest, the first one that
+        # names a module (or was already matched to one) leads to the longest match
+        visited_prefixes = []
+        name = package.import_path
+        while name not in modules_by_prefix:
+            visited_prefixes.append(name)
+            name, separator, _ = name.rpartition("/")
+            if not separator:
+                # This should be impossible
+                raise RuntimeError("Package parent module was not found")
+
+        module = modules_by_prefix[name]
+        # sibling packages share most of their prefixes, remember them for the next lookups
+        modules_by_prefix.update(dict.fromkeys(visited_prefixes, module))
+        return module
 
     def _resolve_package_relative_path(package: ParsedPackage, module: Module) -> str:
         """Return the path for a package relative to its parent module original name."""
-        relative_path = Path(package.import_path).relative_to(module.original_name)
-        return str(relative_path).removeprefix(".")
+        import_path, module_name = package.import_path, module.original_name
+        if import_path == module_name:
+            # the module's root package (interned strings, usually an identity check)
+            return ""
 
-    return [_create_package(package) for package in parsed_packages]
+        tail = import_path[len(module_name) :]
+        if not import_path.startswith(module_name) or (tail and tail[0] != "/"):
+            raise ValueError(f"{import_path!r} is not in the subpath of {module_name!r}")
+        return tail[1:]
+
+    # With workspaces, the packages shared by several workspace modules are listed once per module
+    unique_packages = {package.import_path: package for package in parsed_packages}
+    return [_create_package(package) for package in unique_packages.values()]
 
 
 def fetch_gomod_source(request: Request) -> RequestOutput:
@@ -669,7 +722,8 @@ def fetch_gomod_source(request: Request) -> RequestOutput:
             "deps/gomod/pkg/mod/cache/download"
         )
         gomod_download_dir.path.mkdir(exist_ok=True, parents=True)
-        for subpath in subpaths:
+
+        def _resolve_one(subpath: str) -> list[Component]:
             log.info("Fetching the gomod dependencies at subpath %s", subpath)
 
             main_module_dir = request.source_dir.join_within_root(subpath)
@@ -680,7 +734,7 @@ def fetch_gomod_source(request: Request) -> RequestOutput:
                     main_module_dir, request, Path(tmp_dir), version_resolver, go_work
                 )
             except PackageManagerError:
-                log.error("Failed to fetch gomod dependencies")
+                log.error("Failed to fetch gomod dependencies at subpath %s", subpath)
                 raise
 
             main_module = _create_main_module_from_parsed_data(
@@ -701,21 +755,31 @@ def fetch_gomod_source(request: Request) -> RequestOutput:
 
             packages = _create_packages_from_parsed_data(modules, resolve_result.parsed_packages)
 
-            components.extend(module.to_component() for module in modules)
-            components.extend(package.to_component() for package in packages)
+            return [module.to_component() for module in modules] + [
+                package.to_component() for package in packages
+            ]
+
+        # The symlink checks walk the whole module tree, which includes the modules nested in it.
+        # Run them before any subpath gets vendored, so they don't race with the rewrite of the
+        # vendor/ directory of a nested module.
+        for subpath in subpaths:
+            _protect_against_symlinks(request.source_dir.join_within_root(subpath))
+
+        # Resolving a module is dominated by 'go' subprocesses and network access, so the subpaths
+        # can be processed concurrently. They all share the same Go cache, which Go guards with
+        # file locks. Collect the results in submission order to keep the output deterministic.
+        # If one subpath fails, don't start the ones that are still queued.
+        max_workers = min(len(subpaths), config.concurrency_limit)
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            for subpath_components in executor.map(_resolve_one, subpaths):
+                components.extend(subpath_components)
+        finally:
+            executor.shutdown(cancel_futures=True)
 
         tmp_download_cache_dir = Path(tmp_dir).joinpath("pkg/mod/cache/download")
         if tmp_download_cache_dir.exists():
-            log.debug(
-                "Adding dependencies from %s to %s",
-                tmp_download_cache_dir,
-                gomod_download_dir,
-            )
-            shutil.copytree(
-                tmp_download_cache_dir,
-                str(gomod_download_dir),
-                dirs_exist_ok=True,
-            )
+            _add_downloaded_dependencies(tmp_download_cache_dir, gomod_download_dir.path)
 
     return RequestOutput.from_obj_list(
         components=components,
@@ -726,6 +790,67 @@ def fetch_gomod_source(request: Request) -> RequestOutput:
     )
 
 
+def _add_downloaded_dependencies(download_cache_dir: Path, gomod_download_dir: Path) -> None:
+    """Add the contents of Go's download cache to the output directory.
+
+    :param download_cache_dir: the pkg/mod/cache/download directory of the temporary Go cache
+    :param gomod_download_dir: the output directory, must exist
+    """
+    log.debug("Adding dependencies from %s to %s", download_cache_dir, gomod_download_dir)
+
+    if any(gomod_download_dir.iterdir()):
+        # The files are named after the module version they belong to, so a file that is already
+        # present has the right content. The exception are the 'list' files with known versions.
+        existing_files = frozenset(
+            os.path.join(dirpath, filename)
+            for dirpath, _, filenames in os.walk(gomod_download_dir)
+            for filename in filenames
+        )
+
+        def _merge_file(src: str, dst: str) -> None:
+            if dst not in existing_files:
+                _link_or_copy(src, dst)
+            elif os.path.basename(dst) == "list":
+                _merge_version_lists(src, dst)
+
+        shutil.copytree(
+            download_cache_dir,
+            gomod_download_dir,
+            copy_function=_merge_file,
+            dirs_exist_ok=True,
+        )
+    else:
+        # Nothing to merge with, a move is a simple rename if both are on the same device
+        gomod_download_dir.rmdir()
+        shutil.move(download_cache_dir, gomod_download_dir)
+
+
+def _merge_version_lists(src: str, dst: str) -> None:
+    """Add the versions from the src 'list' file to the dst one, skipping duplicates.
+
+    The merged content is written to a new file, which then replaces dst. This way, a dst file
+    hardlinked from elsewhere doesn't get modified in place.
+    """
+    versions: dict[str, None] = {}
+    for path in (dst, src):
+        with open(path) as f:
+            versions.update(dict.fromkeys(line.rstrip("\n") for line in f))
+    versions.pop("", None)
+
+    tmp_dst = f"{dst}.tmp"
+    with open(tmp_dst, "w") as f:
+        f.writelines(f"{version}\n" for version in versions)
+    os.replace(tmp_dst, dst)
+
+
+def _link_or_copy(src: str, dst: str) -> None:
+    """Hardlink src to dst, fall back to copying if that's not possible (e.g. across devices)."""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
 def _create_main_module_from_parsed_data(
     main_module_dir: RootedPath, repo_name: str, parsed_main_module: ParsedModule
 ) -> Module:
@@ -771,27 +896,14 @@ def _get_gomod_version(go_mod_file: RootedPath) -> Tuple[Optional[str], Optional
     go_version = None
     toolchain_version = None
 
-    # this needs to be able to handle arbitrary pre-release version identifiers and commentaries
-    # as well, since Go itself can parse it
-    # - 'go 1.21.0'
-    # - '   go 1.21.0rc4'
-    # - 'go 1.21beta1//commentary'
-    version_str_regex = r"(?P<ver>\d+\.\d+(:?\.\d+)?(?:[a-zA-Z]+\d+)?)"
-    post_version_chars_regex = r"\s*(?:\/\/.*)?"
-    go_version_regex = rf"^\s*go\s+{version_str_regex}{post_version_chars_regex}$"
-    toolchain_version_regex = rf"^\s*toolchain\s+go{version_str_regex}{post_version_chars_regex}$"
-
-    go_pattern = re.compile(go_version_regex)
-    toolchain_pattern = re.compile(toolchain_version_regex)
-
     with open(go_mod_file) as f:
         for i, line in enumerate(f):
-            if not go_version and (match := re.match(go_pattern, line)):
+            if not go_version and (match := _GOMOD_GO_DIRECTIVE_RE.match(line)):
                 go_version = match.group("ver")
                 log.debug("Matched Go version %s on go.mod line %d: '%s'", go_version, i, line)
                 continue
 
-            if not toolchain_version and (match := re.match(toolchain_pattern, line)):
+            if not toolchain_version and (match := _GOMOD_TOOLCHAIN_DIRECTIVE_RE.match(line)):
                 toolchain_version = match.group("ver")
                 log.debug(
                     "Matched toolchain %s on go.mod line %d: '%s'", toolchain_version, i, line
@@ -839,7 +951,7 @@ def _find_missing_gomod_files(source_path: RootedPath, subpaths: list[str]) -> l
     invalid_gomod_files = []
     for subpath in subpaths:
         package_gomod_path = source_path.join_within_root(subpath, "go.mod").path
-        log.debug("Testing for go mod file in {}".format(package_gomod_path))
+        log.debug("Testing for go mod file in %s", package_gomod_path)
         if not package_gomod_path.exists():
             invalid_gomod_files.append(package_gomod_path)
 
@@ -848,15 +960,16 @@ def _find_missing_gomod_files(source_path: RootedPath, subpaths: list[str]) -> l
 
 def _setup_go_toolchain(go_mod_file: RootedPath) -> Go:
     GO_121 = version.Version("1.21")
+    # the base toolchain version is only needed (and 'go version' only run) for older go.mod files
     go = Go()
     target_version = None
     go_max_version = version.Version("1.24")
-    go_base_version = go.version
-    go_mod_version_msg = "go.mod reported versions: '%s'[go], '%s'[toolchain]"
+    go_mod_version_msg = "%s reported versions: '%s'[go], '%s'[toolchain]"
 
     go_version_str, toolchain_version_str = _get_gomod_version(go_mod_file)
     log.info(
         go_mod_version_msg,
+        go_mod_file.subpath_from_root,
         go_version_str if go_version_str else "-",
         toolchain_version_str if toolchain_version_str else "-",
     )
@@ -867,7 +980,11 @@ def _setup_go_toolchain(go_mod_file: RootedPath) -> Go:
         # [1] https://go.dev/doc/go1.12#modules
         # [2] https://go.dev/ref/mod#go-mod-file-go
         go_version_str = "1.20"
-        log.debug("Could not parse Go version from go.mod, using %s as fallback", go_version_str)
+        log.debug(
+            "Could not parse Go version from %s, using %s as fallback",
+            go_mod_file.subpath_from_root,
+            go_version_str,
+        )
 
     if not toolchain_version_str:
         toolchain_version_str = go_version_str
@@ -895,7 +1012,7 @@ def _setup_go_toolchain(go_mod_file: RootedPath) -> Go:
         # - container environments need to have it pre-installed
         # - local environments will always install 1.21.0 SDK and then pull any newer toolchain
         go = Go(release="go1.21.0")
-    elif go_base_version >= GO_121:
+    elif go.version >= GO_121:
         # Starting with Go 1.21, Go doesn't try to be semantically backwards compatible in that the
         # 'go X.Y' line now denotes the minimum required version of Go, no a "suggested" version.
         # What it means in practice is that a Go toolchain >= 1.21 enforces the biggest common
@@ -927,7 +1044,9 @@ def _go_list_deps(
     The "all" pattern includes dependencies needed only for tests. Use it to get a more
     complete module list (roughly matching the list of downloaded modules).
     """
-    cmd = ["list", "-e", "-deps", "-json=ImportPath,Module,Standard,Deps", pattern]
+    # Only request the fields we parse, the output can get huge for large projects otherwise
+    # (e.g. the Deps field lists all the transitive dependencies of every single package)
+    cmd = ["list", "-e", "-deps", "-json=ImportPath,Module,Standard", pattern]
     return map(
         ParsedPackage.model_validate,
         load_json_stream(go(cmd, run_params)),
@@ -949,16 +1068,15 @@ def _parse_packages(go_work: GoWork, go: Go, run_params: dict[str, Any]) -> Iter
     all_packages: Iterable[ParsedPackage] = []
 
     if not go_work:
-        log.debug("Querying for list of packages")
+        log.debug("Querying for list of packages in '%s'", run_params.get("cwd"))
         all_packages = _go_list_deps(go, "./...", run_params)
     else:
         # If there are workspace modules we need to run 'list -e ./...' under every local module
         # path because 'go list' command isn't fully properly workspace context aware
         for wsp in go_work.workspace_paths(go, run_params):
-            log.debug(f"Querying workspace module '{wsp.path}' for list of packages")
+            log.debug("Querying workspace module '%s' for list of packages", wsp.path)
 
-            packages = list(_go_list_deps(go, "./...", run_params | {"cwd": wsp.path}))
-            log.debug(packages)
+            packages = _go_list_deps(go, "./...", run_params | {"cwd": wsp.path})
             all_packages = chain(all_packages, packages)
     return iter(all_packages)
 
@@ -982,8 +1100,6 @@ def _resolve_gomod(
         ("pkg_deps" key)
     :raises PackageManagerError: if fetching dependencies fails
     """
-    _protect_against_symlinks(app_dir)
-
     config = get_config()
 
     should_vendor = app_dir.join_within_root("vendor").path.is_dir()
@@ -1013,7 +1129,9 @@ def _resolve_gomod(
         env["CGO_ENABLED"] = "0"
 
     go = _setup_go_toolchain(app_dir.join_within_root("go.mod"))
-    log.info(f"Using Go release: {go.release}")
+    # the subpaths are resolved concurrently, keep their log messages apart
+    subpath = app_dir.subpath_from_root
+    log.info("Using Go release %s at subpath %s", go.release, subpath)
 
     run_params = {"env": env, "cwd": app_dir}
 
@@ -1029,7 +1147,7 @@ def _resolve_gomod(
     if should_vendor:
         downloaded_modules = _vendor_deps(go, app_dir, bool(go_work), run_params)
     else:
-        log.info("Downloading the gomod dependencies")
+        log.info("Downloading the gomod dependencies at subpath %s", subpath)
         downloaded_modules = (
             ParsedModule.model_validate(obj)
             for obj in load_json_stream(go(["mod", "download", "-json"], run_params, retry=True))
@@ -1045,7 +1163,7 @@ def _resolve_gomod(
     all_modules = _deduplicate_resolved_modules(package_modules, downloaded_modules)
     _validate_local_replacements(all_modules, app_dir)
 
-    log.info("Retrieving the list of packages")
+    log.info("Retrieving the list of packages at subpath %s", subpath)
     all_packages = _parse_packages(go_work, go, run_params)
 
     return ResolvedGoModule(main_module, all_modules, all_packages, modules_in_go_sum)
@@ -1195,10 +1313,11 @@ def _parse_go_sum(go_sum: RootedPath) -> frozenset[ModuleID]:
             break
 
         name, version, _ = parts
-        if Path(version).name == "go.mod":
+        if version.endswith("/go.mod"):
             continue
 
-        modules.append((name, version))
+        # the same names and versions are held by the parsed modules, which get interned as well
+        modules.append((sys.intern(name), sys.intern(version)))
 
     return frozenset(modules)
 
@@ -1219,33 +1338,28 @@ def _deduplicate_resolved_modules(
 
 class GoCacheTemporaryDirectory(tempfile.TemporaryDirectory[str]):
     """
-    A wrapper around the TemporaryDirectory context manager to also run `go clean -modcache`.
+    A TemporaryDirectory to be used as the GOPATH/GOCACHE/GOMODCACHE of the Go commands.
 
-    The files in the Go cache are read-only by default and cause the default clean up behavior of
-    tempfile.TemporaryDirectory to fail with a permission error. A way around this is to run
-    `go clean -modcache` before the default clean up behavior is run.
+    The files and directories in the Go module cache are read-only. The default clean up behavior
+    of tempfile.TemporaryDirectory already takes care of that: on a permission error, it makes the
+    path (and its parent directory) writable and retries. So there's no need to spawn a
+    `go clean -modcache` process before removing the directory.
     """
 
-    def __exit__(
-        self,
-        exc: Optional[Type[BaseException]],
-        value: Optional[BaseException],
-        tb: Optional[TracebackType],
-    ) -> None:
-        """Clean up the temporary directory by first cleaning up the Go cache."""
-        try:
-            Go()(["clean", "-modcache"], {"env": {"GOPATH": self.name, "GOCACHE": self.name}})
-        finally:
-            super().__exit__(exc, value, tb)
-
 
 class ModuleVersionResolver:
-    """Resolves the versions of Go modules in a git repository."""
+    """Resolves the versions of Go modules in a git repository.
+
+    The resolver is shared by the threads that process the gomod subpaths. GitPython reads objects
+    lazily through a single persistent git process per Repo, which is not thread-safe, so the
+    access to the repository is serialized.
+    """
 
     def __init__(self, repo: git.Repo, commit: git.objects.commit.Commit):
         """Initialize a ModuleVersionResolver for the provided Repo."""
         self._repo = repo
         self._commit = commit
+        self._lock = threading.Lock()
 
     @classmethod
     def from_repo_path(cls, repo_path: RootedPath) -> "Self":
@@ -1330,10 +1444,14 @@ class ModuleVersionResolver:
         :param app_dir: the path to the module directory
         :return: a version as `go list` would provide
         """
+        with self._lock:
+            return self._get_golang_version(module_name, app_dir)
+
+    def _get_golang_version(self, module_name: str, app_dir: RootedPath) -> str:
         # If the module is version v2 or higher, the major version of the module is included as /vN at
         # the end of the module path. If the module is version v0 or v1, the major version is omitted
         # from the module path.
-        match = re.match(r"(?:.+/v)(?P<major_version>\d+)$", module_name)
+        match = _MODULE_MAJOR_VERSION_RE.match(module_name)
         module_major_version = int(match.group("major_version")) if match else None
 
         # If no match, prefer v1.x.x tags but fallback to v0.x.x tags if both are present
@@ -1373,14 +1491,12 @@ class ModuleVersionResolver:
 
             log.debug(
                 "Using the semantic version tag of %s for commit %s",
-                tag_on_commit.name,
+                tag_on_commit,
                 self._commit.hexsha,
             )
 
             # We want to preserve the version in the "v0.0.0" format, so the subpath is not needed
-            return (
-                tag_on_commit.name if not subpath else tag_on_commit.name.replace(f"{subpath}/", "")
-            )
+            return tag_on_commit if not subpath else tag_on_commit.replace(f"{subpath}/", "")
 
         return None
 
@@ -1400,7 +1516,7 @@ class ModuleVersionResolver:
 
             log.debug(
                 "Using the semantic version tag of %s as the pseudo-base for the commit %s",
-                pseudo_base_tag.name,
+                pseudo_base_tag,
                 self._commit.hexsha,
             )
             pseudo_version = self._get_golang_pseudo_version(
@@ -1418,7 +1534,7 @@ class ModuleVersionResolver:
         major_version: int,
         all_reachable: bool = False,
         subpath: Optional[str] = None,
-    ) -> Optional[git.Tag]:
+    ) -> Optional[str]:
         """
         Get the highest semantic version tag related to the input commit.
 
@@ -1427,7 +1543,7 @@ class ModuleVersionResolver:
         :param all_reachable: if False, the search is constrained to the input commit. If True,
             then the search is constrained to the input commit and preceding commits.
         :param subpath: path to the module, relative to the root repository folder
-        :return: the highest semantic version tag if one is found
+        :return: the name of the highest semantic version tag if one is found
         """
         tag_names = self._all_tags if all_reachable else self._commit_tags
 
@@ -1439,6 +1555,14 @@ class ModuleVersionResolver:
         highest: Optional[dict[str, Any]] = None
 
         for tag_name in filtered_tags:
+            # Cheap check of the major version before doing the full semver parsing
+            major_match = _TAG_MAJOR_VERSION_RE.match(tag_name, len(prefix) - 1)
+            if not major_match:
+                log.debug(not_semver_tag_msg, tag_name)
+                continue
+            if int(major_match.group("major")) != major_version:
+                continue
+
             try:
                 semantic_version = self._get_semantic_version_from_tag(tag_name, subpath)
             except ValueError:
@@ -1454,13 +1578,13 @@ class ModuleVersionResolver:
                 highest = {"tag": tag_name, "semver": semantic_version}
 
         if highest:
-            return self._repo.tags[highest["tag"]]
+            return highest["tag"]
 
         return None
 
     def _get_golang_pseudo_version(
         self,
-        tag: Optional[git.Tag] = None,
+        tag: Optional[str] = None,
         module_major_version: Optional[int] = None,
         subpath: Optional[str] = None,
     ) -> str:
@@ -1469,8 +1593,9 @@ class ModuleVersionResolver:
 
         For a description of the algorithm, see https://tip.golang.org/cmd/go/#hdr-Pseudo_versions.
 
-        :param tag: the highest semantic version tag with a matching major version before the
-            input commit. If this isn't specified, it is assumed there was no previous valid tag.
+        :param tag: the name of the highest semantic version tag with a matching major version
+            before the input commit. If this isn't specified, it is assumed there was no previous
+            valid tag.
         :param module_major_version: the Go module's major version as stated in its go.mod file. If
             this and "tag" are not provided, 0 is assumed.
         :param subpath: path to the module, relative to the root repository folder
@@ -1489,7 +1614,7 @@ class ModuleVersionResolver:
             # version of 1, the major version defaults to 0.
             return f'v{module_major_version or "0"}.0.0-{commit_timestamp}-{commit_hash}'
 
-        tag_semantic_version = self._get_semantic_version_from_tag(tag.name, subpath)
+        tag_semantic_version = self._get_semantic_version_from_tag(tag, subpath)
 
         # An example of a semantic version with a prerelease is v2.2.0-alpha
         if tag_semantic_version.prerelease:
@@ -1506,6 +1631,7 @@ class ModuleVersionResolver:
         return f"v{pseudo_semantic_version}{version_seperator}0.{commit_timestamp}-{commit_hash}"
 
     @staticmethod
+    @lru_cache(maxsize=4096)
     def _get_semantic_version_from_tag(
         tag_name: str, subpath: Optional[str] = None
     ) -> semver.version.Version:
@@ -1526,20 +1652,42 @@ class ModuleVersionResolver:
         else:
             semantic_version = tag_name[1:]
 
+        # skip the semver parser for the common "X.Y.Z" case
+        if match := _SEMVER_CORE_RE.fullmatch(semantic_version):
+            return semver.version.Version(*map(int, match.groups()))
+
         return semver.version.Version.parse(semantic_version)
 
 
 def _validate_local_replacements(modules: Iterable[ParsedModule], app_path: RootedPath) -> None:
-    replaced_paths = [
-        (module.path, module.replace.path)
+    # several modules may be replaced with the same local path, resolve each path only once
+    replaced_paths = dict.fromkeys(
+        module.replace.path
         for module in modules
         if module.replace and module.replace.path.startswith(".")
-    ]
+    )
 
-    for _, path in replaced_paths:
+    for path in replaced_paths:
         app_path.join_within_root(path)
 
 
+# Module lines in vendor/modules.txt, one of:
+#   # name version
+#   # name => path
+#   # name => new_name new_version
+#   # name version => path
+#   # name version => new_name new_version
+_VENDOR_MODULE_LINE_RE = re.compile(
+    r"""
+    \#\s+(?P<name>\S+)
+    (?:\s+(?!=>)(?P<version>\S+))?
+    (?:\s+=>\s+(?P<new_name>\S+)(?:\s+(?P<new_version>\S+))?)?
+    \s*$
+    """,
+    re.VERBOSE,
+)
+
+
 def _parse_vendor(context_dir: RootedPath) -> Iterable[ParsedModule]:
     """Parse modules from vendor/modules.txt."""
     modules_txt = context_dir.join_within_root("vendor", "modules.txt")
@@ -1554,48 +1702,45 @@ def _parse_vendor(context_dir: RootedPath) -> Iterable[ParsedModule]:
         raise UnexpectedFormat(f"vendor/modules.txt: {msg}", solution=solution)
 
     def parse_module_line(line: str) -> ParsedModule:
-        parts = line.removeprefix("# ").split()
-        # name version
-        if len(parts) == 2:
-            name, version = parts
-            return ParsedModule(path=name, version=version)
-        # name => path
-        if len(parts) == 3 and parts[1] == "=>":
-            name, _, path = parts
-            return ParsedModule(path=name, replace=ParsedModule(path=path))
-        # name => new_name new_version
-        if len(parts) == 4 and parts[1] == "=>":
-            name, _, new_name, new_version = parts
-            return ParsedModule(path=name, replace=ParsedModule(path=new_name, version=new_version))
-        # name version => path
-        if len(parts) == 4 and parts[2] == "=>":
-            name, version, _, path = parts
-            return ParsedModule(path=name, version=version, replace=ParsedModule(path=path))
-        # name version => new_name new_version
-        if len(parts) == 5 and parts[2] == "=>":
-            name, version, _, new_name, new_version = parts
-            return ParsedModule(
-                path=name,
-                version=version,
-                replace=ParsedModule(path=new_name, version=new_version),
-            )
-        fail_for_unexpected_format(f"unexpected module line format: {line!r}")
+        match = _VENDOR_MODULE_LINE_RE.match(line)
+        # a module line needs at least a version or a replacement
+        if not match or not (match["version"] or match["new_name"]):
+            fail_for_unexpected_format(f"unexpected module line format: {line!r}")
+
+        replace = None
+        if match["new_name"]:
+            replace = ParsedModule(path=match["new_name"], version=match["new_version"])
 
+        return ParsedModule(path=match["name"], version=match["version"], replace=replace)
+
+    # only the modules that have packages are returned, so a module is kept pending until
+    # its first package line (the packages are listed right after their module line)
     modules: list[ParsedModule] = []
-    module_has_packages: list[bool] = []
-
-    for line in modules_txt.path.read_text().splitlines():
-        if line.startswith("# "):  # module line
-            modules.append(parse_module_line(line))
-            module_has_packages.append(False)
-        elif not line.startswith("#"):  # package line
-            if not modules:
+    pending_module: Optional[ParsedModule] = None
+
+    with modules_txt.path.open() as f:
+        for line in f:
+            line = line.rstrip("\n")
+            # classify the line by its first two characters, a single slice per line
+            line_kind = line[:2]
+            if line_kind == "# ":  # module line
+                pending_module = parse_module_line(line)
+            elif line_kind == "##":  # marker line
+                continue
+            elif line_kind[:1] == "#":
+                fail_for_unexpected_format(f"unexpected format: {line!r}")
+            elif pending_module is not None:  # package line, the first one of its module
+                modules.append(pending_module)
+                pending_module = None
+            elif not modules:  # package line, but there was no module line before
                 fail_for_unexpected_format(f"package has no parent module: {line}")
-            module_has_packages[-1] = True
-        elif not line.startswith("##"):  # marker line
-            fail_for_unexpected_format(f"unexpected format: {line!r}")
 
-    return (module for module, has_packages in zip(modules, module_has_packages) if has_packages)
+    return modules
+
+
+# Vendoring rewrites the vendor/ directory in place. The subpaths of a request are resolved
+# concurrently and may share a vendor/ directory (workspaces), so vendor one of them at a time.
+_vendor_lock = threading.Lock()
 
 
 def _vendor_deps(
@@ -1617,23 +1762,24 @@ def _vendor_deps(
     :raise PackageRejected: if vendor directory changed
     :raise UnexpectedFormat: if application fails to parse vendor/modules.txt
     """
-    log.info("Vendoring the gomod dependencies")
+    log.info("Vendoring the gomod dependencies at subpath %s", context_dir.subpath_from_root)
 
     cmdscope = "work" if has_workspace else "mod"
-    go([cmdscope, "vendor"], run_params)
-    if _vendor_changed(context_dir):
-        raise PackageRejected(
-            reason=(
-                "The content of the vendor directory is not consistent with go.mod. "
-                "Please check the logs for more details."
-            ),
-            solution=(
-                "Please try running `go mod vendor` and committing the changes.\n"
-                "Note that you may need to `git add --force` ignored files in the vendor/ dir."
-            ),
-            docs=VENDORING_DOC,
-        )
-    return _parse_vendor(context_dir)
+    with _vendor_lock:
+        go([cmdscope, "vendor"], run_params)
+        if _vendor_changed(context_dir):
+            raise PackageRejected(
+                reason=(
+                    "The content of the vendor directory is not consistent with go.mod. "
+                    "Please check the logs for more details."
+                ),
+                solution=(
+                    "Please try running `go mod vendor` and committing the changes.\n"
+                    "Note that you may need to `git add --force` ignored files in the vendor/ dir."
+                ),
+                docs=VENDORING_DOC,
+            )
+        return _parse_vendor(context_dir)
 
 
 def _vendor_changed(context_dir: RootedPath) -> bool:
@@ -1646,22 +1792,63 @@ def _vendor_changed(context_dir: RootedPath) -> bool:
     modules_txt = vendor / "modules.txt"
 
     repo = git.Repo(repo_root)
-    # Add untracked files but do not stage them
-    repo.git.add("--intent-to-add", "--force", "--", context_dir)
+    vendor_changes = _vendor_name_status(repo, vendor)
+
+    # Diffing modules.txt should catch most issues and produce relatively useful output
+    modules_txt_status = vendor_changes.get(modules_txt.as_posix())
+    if modules_txt_status:
+        if modules_txt_status == "A":
+            # git diff doesn't show untracked files, diff against an empty file instead
+            modules_txt_diff = repo.git.diff(
+                "--no-index", "--", os.devnull, str(modules_txt), with_exceptions=False
+            )
+        else:
+            modules_txt_diff = repo.git(no_optional_locks=True).diff("--", str(modules_txt))
 
-    try:
-        # Diffing modules.txt should catch most issues and produce relatively useful output
-        modules_txt_diff = repo.git.diff("--", str(modules_txt))
         if modules_txt_diff:
             log.error("%s changed after vendoring:\n%s", modules_txt, modules_txt_diff)
             return True
 
-        # Show only if files were added/deleted/modified, not the full diff
-        vendor_diff = repo.git.diff("--name-status", "--", str(vendor))
-        if vendor_diff:
-            log.error("%s directory changed after vendoring:\n%s", vendor, vendor_diff)
-            return True
-    finally:
-        repo.git.reset("--", context_dir)
+    # Show only if files were added/deleted/modified, not the full diff
+    if vendor_changes:
+        vendor_diff = "\n".join(f"{status}\t{path}" for path, status in vendor_changes.items())
+        log.error("%s directory changed after vendoring:\n%s", vendor, vendor_diff)
+        return True
 
     return False
+
+
+def _vendor_name_status(repo: git.Repo, vendor: Path) -> dict[str, str]:
+    """Return the files in the vendor directory that differ from the index.
+
+    This is what 'git diff' reports after adding the untracked files with --intent-to-add: staged
+    changes are not reported, only the differences between the working tree and the index. Unlike
+    'git diff', 'git status' reports the untracked (and ignored) files as well, so there's no need
+    to add them to the index first. With --no-optional-locks, git status doesn't write the index
+    either, so the check is read-only and safe to run for several subpaths at once.
+
+    :return: a {path: status letter} dict, sorted by the path relative to the repository root.
+        Untracked files are reported as "A", renames are reported under the new path only.
+    """
+    # without --no-optional-locks, git status refreshes the index (and takes index.lock) if it can
+    status_output = repo.git(no_optional_locks=True).status(
+        "--porcelain", "-z", "--untracked-files=all", "--ignored", "--", str(vendor)
+    )
+    entries = iter(status_output.split("\0"))
+
+    changes = {}
+    for entry in entries:
+        if not entry:
+            continue
+        index_status, worktree_status, path = entry[0], entry[1], entry[3:]
+        if index_status in "RC" or worktree_status in "RC":
+            # renamed or copied, the next entry is the original path
+            next(entries, None)
+        if index_status in "?!":
+            # untracked or ignored
+            changes[path] = "A"
+        elif worktree_status != " ":
+            # the status of the index vs. HEAD doesn't matter, compare the working tree to the index
+            changes[path] = worktree_status
+
+    return dict(sorted(changes.items()))
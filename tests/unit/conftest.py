@@ -15,16 +15,27 @@ def data_dir() -> Path:
     return Path(__file__).parent / "data"
 
 
-@pytest.fixture
-def golang_repo_path(data_dir: Path, tmp_path: Path) -> Path:
-    """Return extracted Golang git repository inside a temporary directory."""
+def _extract_golang_repo(data_dir: Path, dest_dir: Path) -> Path:
     with tarfile.open(data_dir / "golang_git_repo.tar.gz") as tar:
         if sys.version_info >= (3, 12):
-            tar.extractall(tmp_path, filter="fully_trusted")
+            tar.extractall(dest_dir, filter="fully_trusted")
         else:
-            tar.extractall(tmp_path)
+            tar.extractall(dest_dir)
+
+    return dest_dir / "golang_git_repo"
+
+
+@pytest.fixture
+def golang_repo_path(data_dir: Path, tmp_path: Path) -> Path:
+    """Return extracted Golang git repository inside a temporary directory."""
+    return _extract_golang_repo(data_dir, tmp_path)
+
 
-    return tmp_path / "golang_git_repo"
+@pytest.fixture(scope="module")
+def shared_golang_repo_path(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    """Return Golang git repository extracted once per test module, tests must not modify it."""
+    data_dir = Path(__file__).parent / "data"
+    return _extract_golang_repo(data_dir, tmp_path_factory.mktemp("golang_repo"))
 
 
 @pytest.fixture
@@ -33,20 +44,31 @@ def rooted_tmp_path(tmp_path: Path) -> RootedPath:
     return RootedPath(tmp_path)
 
 
-@pytest.fixture
-def rooted_tmp_path_repo(rooted_tmp_path: RootedPath) -> RootedPath:
-    """Return RootedPath object wrapper for the tmp_path fixture with initialized git repository."""
-    repo = git.Repo.init(rooted_tmp_path)
+def _init_repo(path: Path) -> None:
+    repo = git.Repo.init(path)
     repo.git.config("user.name", "user")
     repo.git.config("user.email", "user@example.com")
 
-    Path(rooted_tmp_path, "README.md").touch()
+    Path(path, "README.md").touch()
     repo.index.add(["README.md"])
     repo.index.commit("Initial commit")
 
+
+@pytest.fixture
+def rooted_tmp_path_repo(rooted_tmp_path: RootedPath) -> RootedPath:
+    """Return RootedPath object wrapper for the tmp_path fixture with initialized git repository."""
+    _init_repo(rooted_tmp_path.path)
     return rooted_tmp_path
 
 
+@pytest.fixture(scope="module")
+def shared_rooted_tmp_path_repo(tmp_path_factory: pytest.TempPathFactory) -> RootedPath:
+    """Return a RootedPath to an initialized git repository, shared by the tests in a module."""
+    repo_path = tmp_path_factory.mktemp("repo")
+    _init_repo(repo_path)
+    return RootedPath(repo_path)
+
+
 @pytest.fixture
 def input_request(tmp_path: Path, request: pytest.FixtureRequest) -> Request:
     package_input: list[dict[str, str]] = request.param
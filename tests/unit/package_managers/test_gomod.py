@@ -1,12 +1,15 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
+import contextlib
+import functools
 import json
+import logging
 import os
 import re
 import subprocess
 import textwrap
 from pathlib import Path
 from string import Template
-from typing import Any, Iterator, Literal, Optional, Tuple, Union
+from typing import Any, Iterator, Literal, NamedTuple, Optional, Tuple, Union
 from unittest import mock
 
 import git
@@ -20,6 +23,7 @@ from hermeto.core.models.output import BuildConfig, EnvironmentVariable, Request
 from hermeto.core.models.sbom import Component, Property
 from hermeto.core.package_managers.gomod import (
     Go,
+    GoCacheTemporaryDirectory,
     GoWork,
     Module,
     ModuleDict,
@@ -31,6 +35,7 @@ from hermeto.core.package_managers.gomod import (
     ParsedPackage,
     ResolvedGoModule,
     StandardPackage,
+    _add_downloaded_dependencies,
     _create_modules_from_parsed_data,
     _create_packages_from_parsed_data,
     _deduplicate_resolved_modules,
@@ -39,17 +44,20 @@ from hermeto.core.package_managers.gomod import (
     _get_gomod_version,
     _get_repository_name,
     _go_list_deps,
+    _link_or_copy,
     _parse_go_sum,
     _parse_local_modules,
     _parse_packages,
     _parse_vendor,
     _parse_workspace_module,
     _process_modules_json_stream,
+    _protect_against_symlinks,
     _resolve_gomod,
     _setup_go_toolchain,
     _validate_local_replacements,
     _vendor_changed,
     _vendor_deps,
+    _vendor_lock,
     fetch_gomod_source,
 )
 from hermeto.core.rooted_path import PathOutsideRoot, RootedPath
@@ -103,10 +111,7 @@ def gomod_request(tmp_path: Path, gomod_input_packages: list[dict[str, str]]) ->
 
 @pytest.fixture
 def go_mod_file(tmp_path: Path, request: pytest.FixtureRequest) -> None:
-    output_file = tmp_path / "go.mod"
-
-    with open(output_file, "w") as f:
-        f.write(request.param)
+    tmp_path.joinpath("go.mod").write_text(request.param)
 
 
 def proc_mock(
@@ -115,10 +120,36 @@ def proc_mock(
     return subprocess.CompletedProcess(args, returncode=returncode, stdout=stdout)
 
 
+class ResolveGomodMocks(NamedTuple):
+    run: mock.Mock
+    version_resolver: mock.Mock
+    get_gomod_version: mock.Mock
+    go_release: mock.PropertyMock
+
+
+@pytest.fixture
+def gomod_mocks() -> Iterator[ResolveGomodMocks]:
+    """Patch the Go commands, toolchain setup and version resolution for the _resolve_gomod tests."""
+    gomod = "hermeto.core.package_managers.gomod"
+
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(mock.patch(f"{gomod}._disable_telemetry", return_value=None))
+        yield ResolveGomodMocks(
+            run=stack.enter_context(mock.patch("subprocess.run")),
+            version_resolver=stack.enter_context(mock.patch(f"{gomod}.ModuleVersionResolver")),
+            get_gomod_version=stack.enter_context(mock.patch(f"{gomod}._get_gomod_version")),
+            go_release=stack.enter_context(
+                mock.patch(f"{gomod}.Go.release", new_callable=mock.PropertyMock)
+            ),
+        )
+
+
 def get_mock_dir(data_dir: Path) -> Path:
     return data_dir / "gomod-mocks"
 
 
+# the same mock files are read by many test cases, read each one only once
+@functools.cache
 def get_mocked_data(data_dir: Path, filepath: Union[str, Path]) -> str:
     return get_mock_dir(data_dir).joinpath(filepath).read_text()
 
@@ -153,25 +184,16 @@ def _parse_go_list_deps_data(data_dir: Path, file_path: str) -> list[ParsedPacka
 @mock.patch("hermeto.core.package_managers.gomod._parse_packages")
 @mock.patch("hermeto.core.package_managers.gomod.GoWork._get_go_work")
 @mock.patch("hermeto.core.package_managers.gomod.GoWork._get_go_work_path")
-@mock.patch("hermeto.core.package_managers.gomod._disable_telemetry")
-@mock.patch("hermeto.core.package_managers.gomod.Go.release", new_callable=mock.PropertyMock)
-@mock.patch("hermeto.core.package_managers.gomod._get_gomod_version")
-@mock.patch("hermeto.core.package_managers.gomod.ModuleVersionResolver")
 @mock.patch("hermeto.core.package_managers.gomod._validate_local_replacements")
-@mock.patch("subprocess.run")
 def test_resolve_gomod(
-    mock_run: mock.Mock,
     mock_validate_local_replacements: mock.Mock,
-    mock_version_resolver: mock.Mock,
-    mock_get_gomod_version: mock.Mock,
-    mock_go_release: mock.PropertyMock,
-    mock_disable_telemetry: mock.Mock,
     mock_get_go_work_path: mock.Mock,
     mock_get_go_work: mock.Mock,
     mock_parse_packages: mock.Mock,
     mock_go_list_deps: mock.Mock,
     cgo_disable: bool,
     has_workspaces: bool,
+    gomod_mocks: ResolveGomodMocks,
     tmp_path: Path,
     data_dir: Path,
     gomod_request: Request,
@@ -180,40 +202,33 @@ def test_resolve_gomod(
 
     module_dir = gomod_request.source_dir.join_within_root("path/to/module")
     mocked_data_folder = "non-vendored" if not has_workspaces else "workspaces"
-    mock_disable_telemetry.return_value = None
     workspace_paths: list = []
     go_work = mock.MagicMock()
     go_work.__bool__.return_value = False
 
     # Mock the "subprocess.run" calls
-    run_side_effects = []
-
-    run_side_effects.append(
+    gomod_mocks.run.side_effect = [
         proc_mock(
             "go mod download -json",
             returncode=0,
             stdout=get_mocked_data(data_dir, f"{mocked_data_folder}/go_mod_download.json"),
-        )
-    )
-
-    run_side_effects.append(
+        ),
         proc_mock(
             "go list -e -m",
             returncode=0,
             stdout=get_mocked_data(data_dir, f"{mocked_data_folder}/go_list_modules.json").replace(
                 "{repo_dir}", str(module_dir)
             ),
-        )
-    )
-    mock_run.side_effect = run_side_effects
+        ),
+    ]
     mock_go_list_deps.side_effect = [
         _parse_go_list_deps_data(data_dir, f"{mocked_data_folder}/go_list_deps_all.json"),
         _parse_go_list_deps_data(data_dir, f"{mocked_data_folder}/go_list_deps_threedot.json"),
     ]
 
-    mock_version_resolver.get_golang_version.return_value = "v0.1.0"
-    mock_go_release.return_value = "go0.1.0"
-    mock_get_gomod_version.return_value = ("0.1.1", "0.1.2")
+    gomod_mocks.version_resolver.get_golang_version.return_value = "v0.1.0"
+    gomod_mocks.go_release.return_value = "go0.1.0"
+    gomod_mocks.get_gomod_version.return_value = ("0.1.1", "0.1.2")
 
     parse_packages_mocked_data: list[ParsedPackage] = []
     mock_parse_packages.return_value = parse_packages_mocked_data
@@ -256,10 +271,10 @@ def test_resolve_gomod(
     )
 
     resolve_result = _resolve_gomod(
-        module_dir, gomod_request, tmp_path, mock_version_resolver, go_work
+        module_dir, gomod_request, tmp_path, gomod_mocks.version_resolver, go_work
     )
 
-    assert mock_run.call_args_list[0][1]["env"]["GOMODCACHE"] == f"{tmp_path}/pkg/mod"
+    assert gomod_mocks.run.call_args_list[0][1]["env"]["GOMODCACHE"] == f"{tmp_path}/pkg/mod"
 
     # Assert that _parse_packages was called exactly once.
     # Assert that the module-parsing _go_list_deps call was called with the 'all' pattern. The
@@ -269,12 +284,12 @@ def test_resolve_gomod(
     mock_go_list_deps.assert_called_once()
     assert "all" in mock_go_list_deps.call_args[0]
 
-    for call in mock_run.call_args_list:
-        env = call.kwargs["env"]
-        if cgo_disable:
-            assert env["CGO_ENABLED"] == "0"
-        else:
-            assert "CGO_ENABLED" not in env
+    # all the go commands get the same env, check it on one of them
+    env = gomod_mocks.run.call_args.kwargs["env"]
+    if cgo_disable:
+        assert env["CGO_ENABLED"] == "0"
+    else:
+        assert "CGO_ENABLED" not in env
 
     if has_workspaces:
         expect_result = _parse_mocked_data(
@@ -293,62 +308,48 @@ def test_resolve_gomod(
     )
 
 
-@mock.patch("hermeto.core.package_managers.gomod._disable_telemetry")
-@mock.patch("hermeto.core.package_managers.gomod.Go.release", new_callable=mock.PropertyMock)
-@mock.patch("hermeto.core.package_managers.gomod._get_gomod_version")
-@mock.patch("hermeto.core.package_managers.gomod.ModuleVersionResolver")
 @mock.patch("hermeto.core.package_managers.gomod._validate_local_replacements")
 @mock.patch("hermeto.core.package_managers.gomod._vendor_changed")
-@mock.patch("subprocess.run")
 def test_resolve_gomod_vendor_dependencies(
-    mock_run: mock.Mock,
     mock_vendor_changed: mock.Mock,
     mock_validate_local_replacements: mock.Mock,
-    mock_version_resolver: mock.Mock,
-    mock_get_gomod_version: mock.Mock,
-    mock_go_release: mock.PropertyMock,
-    mock_disable_telemetry: mock.Mock,
+    gomod_mocks: ResolveGomodMocks,
     tmp_path: Path,
     data_dir: Path,
     gomod_request: Request,
+    caplog: pytest.LogCaptureFixture,
 ) -> None:
+    caplog.set_level(logging.INFO)
     module_dir = gomod_request.source_dir.join_within_root("path/to/module")
-    mock_disable_telemetry.return_value = None
 
     mocked_go_work = mock.MagicMock()
     mocked_go_work.__bool__.return_value = False
 
     # Mock the "subprocess.run" calls
-    run_side_effects = []
-    run_side_effects.append(proc_mock("go mod vendor", returncode=0, stdout=None))
-    run_side_effects.append(
+    gomod_mocks.run.side_effect = [
+        proc_mock("go mod vendor", returncode=0, stdout=None),
         proc_mock(
             "go list -e -m -json",
             returncode=0,
             stdout=get_mocked_data(data_dir, "non-vendored/go_list_modules.json").replace(
                 "{repo_dir}", str(module_dir)
             ),
-        )
-    )
-    run_side_effects.append(
+        ),
         proc_mock(
             "go list -e -deps -json all",
             returncode=0,
             stdout=get_mocked_data(data_dir, "vendored/go_list_deps_all.json"),
-        )
-    )
-    run_side_effects.append(
+        ),
         proc_mock(
             "go list -e -deps -json ./...",
             returncode=0,
             stdout=get_mocked_data(data_dir, "vendored/go_list_deps_threedot.json"),
-        )
-    )
-    mock_run.side_effect = run_side_effects
+        ),
+    ]
 
-    mock_version_resolver.get_golang_version.return_value = "v0.1.0"
-    mock_go_release.return_value = "go0.1.0"
-    mock_get_gomod_version.return_value = ("0.1.1", "0.1.2")
+    gomod_mocks.version_resolver.get_golang_version.return_value = "v0.1.0"
+    gomod_mocks.go_release.return_value = "go0.1.0"
+    gomod_mocks.get_gomod_version.return_value = ("0.1.1", "0.1.2")
     mock_vendor_changed.return_value = False
 
     module_dir.join_within_root("vendor").path.mkdir(parents=True)
@@ -360,17 +361,17 @@ def test_resolve_gomod_vendor_dependencies(
     )
 
     resolve_result = _resolve_gomod(
-        module_dir, gomod_request, tmp_path, mock_version_resolver, mocked_go_work
+        module_dir, gomod_request, tmp_path, gomod_mocks.version_resolver, mocked_go_work
     )
 
-    assert mock_run.call_args_list[0][0][0] == [GO_CMD_PATH, "mod", "vendor"]
-    assert mock_run.call_args_list[0][1]["env"]["GOMODCACHE"] == f"{tmp_path}/vendor-cache"
-    assert mock_run.call_args_list[-2][0][0] == [
+    assert gomod_mocks.run.call_args_list[0][0][0] == [GO_CMD_PATH, "mod", "vendor"]
+    assert gomod_mocks.run.call_args_list[0][1]["env"]["GOMODCACHE"] == f"{tmp_path}/vendor-cache"
+    assert gomod_mocks.run.call_args_list[-2][0][0] == [
         GO_CMD_PATH,
         "list",
         "-e",
         "-deps",
-        "-json=ImportPath,Module,Standard,Deps",
+        "-json=ImportPath,Module,Standard",
         "all",
     ]
 
@@ -381,43 +382,35 @@ def test_resolve_gomod_vendor_dependencies(
     assert list(resolve_result.parsed_packages) == expect_result.parsed_packages
     assert resolve_result.modules_in_go_sum == expect_result.modules_in_go_sum
 
+    # the subpaths are resolved concurrently, their messages need to tell them apart
+    assert "Using Go release go0.1.0 at subpath path/to/module" in caplog.messages
+    assert "Vendoring the gomod dependencies at subpath path/to/module" in caplog.messages
+    assert "Retrieving the list of packages at subpath path/to/module" in caplog.messages
+
+
+# 'go list -deps -json' output for a module without any dependencies
+MOCK_PKG_DEPS_NO_DEPS = json.dumps(
+    {
+        "ImportPath": "github.com/release-engineering/retrodep/v2",
+        "Module": {"Path": "github.com/release-engineering/retrodep/v2", "Main": True},
+    }
+)
+
 
-@mock.patch("hermeto.core.package_managers.gomod._disable_telemetry")
-@mock.patch("hermeto.core.package_managers.gomod.Go.release", new_callable=mock.PropertyMock)
 @mock.patch("hermeto.core.package_managers.gomod.Go._install")
 @mock.patch("hermeto.core.package_managers.gomod.Go._locate_toolchain")
-@mock.patch("hermeto.core.package_managers.gomod._get_gomod_version")
-@mock.patch("hermeto.core.package_managers.gomod.ModuleVersionResolver")
-@mock.patch("subprocess.run")
 def test_resolve_gomod_no_deps(
-    mock_run: mock.Mock,
-    mock_version_resolver: mock.Mock,
-    mock_get_gomod_version: mock.Mock,
     mock_go_locate_toolchain: mock.Mock,
     mock_go_install: mock.Mock,
-    mock_go_release: mock.PropertyMock,
-    mock_disable_telemetry: mock.Mock,
+    gomod_mocks: ResolveGomodMocks,
     tmp_path: Path,
     gomod_request: Request,
 ) -> None:
     module_path = gomod_request.source_dir.join_within_root("path/to/module")
-    mock_disable_telemetry.return_value = None
 
     mocked_go_work = mock.MagicMock()
     mocked_go_work.__bool__.return_value = False
 
-    mock_pkg_deps_no_deps = textwrap.dedent(
-        """
-        {
-            "ImportPath": "github.com/release-engineering/retrodep/v2",
-            "Module": {
-                "Path": "github.com/release-engineering/retrodep/v2",
-                "Main": true
-            }
-        }
-        """
-    )
-
     mock_go_list_modules = Template(
         """
         {
@@ -431,30 +424,24 @@ def test_resolve_gomod_no_deps(
     ).substitute({"repo_dir": str(module_path)})
 
     # Mock the "subprocess.run" calls
-    run_side_effects = []
-    run_side_effects.append(proc_mock("go mod download -json", returncode=0, stdout=""))
-    run_side_effects.append(
+    gomod_mocks.run.side_effect = [
+        proc_mock("go mod download -json", returncode=0, stdout=""),
         proc_mock(
             "go list -e -m",
             returncode=0,
             stdout=mock_go_list_modules,
-        )
-    )
-    run_side_effects.append(
-        proc_mock("go list -e -deps -json all", returncode=0, stdout=mock_pkg_deps_no_deps)
-    )
-    run_side_effects.append(
-        proc_mock("go list -e -deps -json ./...", returncode=0, stdout=mock_pkg_deps_no_deps)
-    )
-    mock_run.side_effect = run_side_effects
+        ),
+        proc_mock("go list -e -deps -json all", returncode=0, stdout=MOCK_PKG_DEPS_NO_DEPS),
+        proc_mock("go list -e -deps -json ./...", returncode=0, stdout=MOCK_PKG_DEPS_NO_DEPS),
+    ]
 
-    mock_version_resolver.get_golang_version.return_value = "v1.21.4"
-    mock_go_release.return_value = "go1.21.0"
+    gomod_mocks.version_resolver.get_golang_version.return_value = "v1.21.4"
+    gomod_mocks.go_release.return_value = "go1.21.0"
     mock_go_install.return_value = "/usr/bin/go"
-    mock_get_gomod_version.return_value = ("1.21.4", None)
+    gomod_mocks.get_gomod_version.return_value = ("1.21.4", None)
 
     main_module, modules, packages, _ = _resolve_gomod(
-        module_path, gomod_request, tmp_path, mock_version_resolver, mocked_go_work
+        module_path, gomod_request, tmp_path, gomod_mocks.version_resolver, mocked_go_work
     )
     packages_list = list(packages)
 
@@ -485,17 +472,13 @@ def test_resolve_gomod_no_deps(
         "vendor/github.com/foo/bar/main.go",
     ],
 )
-def test_resolve_gomod_suspicious_symlinks(symlinked_file: str, gomod_request: Request) -> None:
-    tmp_path = gomod_request.source_dir.path
+def test_protect_against_symlinks(symlinked_file: str, rooted_tmp_path: RootedPath) -> None:
+    tmp_path = rooted_tmp_path.path
     tmp_path.joinpath(symlinked_file).parent.mkdir(parents=True, exist_ok=True)
     tmp_path.joinpath(symlinked_file).symlink_to("/foo")
-    version_resolver = mock.Mock()
-    go_work = mock.Mock()
-
-    app_dir = gomod_request.source_dir
 
     with pytest.raises(PathOutsideRoot):
-        _resolve_gomod(app_dir, gomod_request, tmp_path, version_resolver, go_work)
+        _protect_against_symlinks(rooted_tmp_path)
 
 
 @pytest.mark.parametrize(
@@ -1060,6 +1043,15 @@ def test_create_packages_from_parsed_data() -> None:
         ParsedPackage(
             import_path="github.com/my-org/my-repo/child-module/child-pkg",
         ),
+        # nested package from the same child module, with module reference missing
+        ParsedPackage(
+            import_path="github.com/my-org/my-repo/child-module/child-pkg/nested-pkg",
+        ),
+        # duplicate pkg (e.g. listed by multiple workspace modules)
+        ParsedPackage(
+            import_path="github.com/stretchr/testify/assert",
+            module=ParsedModule(path="github.com/stretchr/testify", version="v1.7.1"),
+        ),
     ]
 
     expect_packages = [
@@ -1101,6 +1093,15 @@ def test_create_packages_from_parsed_data() -> None:
                 real_path="github.com/my-org/my-repo/child-module",
             ),
         ),
+        Package(
+            relative_path="child-pkg/nested-pkg",
+            module=Module(
+                name="github.com/my-org/my-repo/child-module",
+                version="v1.0.1",
+                original_name="github.com/my-org/my-repo/child-module",
+                real_path="github.com/my-org/my-repo/child-module",
+            ),
+        ),
     ]
 
     packages = _create_packages_from_parsed_data(modules, parsed_packages)
@@ -1208,7 +1209,7 @@ def test_go_list_deps(mock_run_cmd: mock.Mock, pattern: Literal["all", "./..."])
     ]
 
     mock_run_cmd.return_value = go_list_deps_json
-    call_args = ["go", "list", "-e", "-deps", "-json=ImportPath,Module,Standard,Deps", pattern]
+    call_args = ["go", "list", "-e", "-deps", "-json=ImportPath,Module,Standard", pattern]
     assert list(_go_list_deps(Go(), pattern, {})) == parsed_packages
     mock_run_cmd.assert_called_once_with(call_args, {})
 
@@ -1394,7 +1395,7 @@ def test_deduplicate_resolved_modules() -> None:
     ),
 )
 def test_get_golang_version(
-    golang_repo_path: Path,
+    shared_golang_repo_path: Path,
     module_suffix: str,
     ref: str,
     expected: str,
@@ -1402,9 +1403,9 @@ def test_get_golang_version(
 ) -> None:
     module_name = f"github.com/mprahl/test-golang-pseudo-versions{module_suffix}"
 
-    module_dir = RootedPath(golang_repo_path)
-    repo = git.Repo(golang_repo_path)
-    repo.git.checkout(ref)
+    # the version is resolved from the commit and tags alone, no need to check out the ref
+    module_dir = RootedPath(shared_golang_repo_path)
+    repo = git.Repo(shared_golang_repo_path)
     version_resolver = ModuleVersionResolver(repo, repo.commit(ref))
 
     if subpath:
@@ -1455,7 +1456,13 @@ def test_vendor_deps(
 ) -> None:
     app_dir = rooted_tmp_path.join_within_root("some/module")
     run_params = {"cwd": app_dir}
-    mock_vendor_changed.return_value = vendor_changed
+
+    def vendor_changed_mocked(context_dir: RootedPath) -> bool:
+        # no other subpath may rewrite the vendor/ directory until it's checked
+        assert _vendor_lock.locked()
+        return vendor_changed
+
+    mock_vendor_changed.side_effect = vendor_changed_mocked
 
     if vendor_changed:
         msg = "The content of the vendor directory is not consistent with go.mod."
@@ -1466,6 +1473,7 @@ def test_vendor_deps(
 
     mock_run_cmd.assert_called_once_with(["go", go_vendor_cmd, "vendor"], **run_params)
     mock_vendor_changed.assert_called_once_with(app_dir)
+    assert not _vendor_lock.locked()
 
 
 def test_parse_vendor(rooted_tmp_path: RootedPath, data_dir: Path) -> None:
@@ -1537,6 +1545,18 @@ def test_parse_vendor_unexpected_format(
         _parse_vendor(rooted_tmp_path)
 
 
+@pytest.fixture
+def clean_rooted_repo(shared_rooted_tmp_path_repo: RootedPath) -> Iterator[RootedPath]:
+    """Return the shared git repository, restored to its initial state after the test."""
+    repo = git.Repo(shared_rooted_tmp_path_repo)
+    initial_commit = repo.head.commit.hexsha
+
+    yield shared_rooted_tmp_path_repo
+
+    repo.git.reset("--hard", initial_commit)
+    repo.git.clean("-ffdx")
+
+
 @pytest.mark.parametrize("subpath", ["", "some/app/"])
 @pytest.mark.parametrize(
     "vendor_before, vendor_changes, expected_change",
@@ -1576,22 +1596,13 @@ def test_parse_vendor_unexpected_format(
         (
             {},
             {"vendor": {"some_file": "foo"}},
-            textwrap.dedent(
-                """
-                A\t{subpath}vendor/some_file
-                """
-            ),
+            "\nA\t{subpath}vendor/some_file\n",
         ),
         # multiple additions and modifications
         (
             {"vendor": {"some_file": "foo"}},
             {"vendor": {"some_file": "bar", "other_file": "baz"}},
-            textwrap.dedent(
-                """
-                A\t{subpath}vendor/other_file
-                M\t{subpath}vendor/some_file
-                """
-            ),
+            "\nA\t{subpath}vendor/other_file\nM\t{subpath}vendor/some_file\n",
         ),
         # vendor/ was added but only contains empty dirs => will be ignored
         ({}, {"vendor": {"empty_dir": {}}}, None),
@@ -1599,11 +1610,7 @@ def test_parse_vendor_unexpected_format(
         (
             {".gitignore": "vendor/"},
             {"vendor": {"some_file": "foo"}},
-            textwrap.dedent(
-                """
-                A\t{subpath}vendor/some_file
-                """
-            ),
+            "\nA\t{subpath}vendor/some_file\n",
         ),
     ],
 )
@@ -1612,12 +1619,12 @@ def test_vendor_changed(
     vendor_before: dict[str, Any],
     vendor_changes: dict[str, Any],
     expected_change: Optional[str],
-    rooted_tmp_path_repo: RootedPath,
+    clean_rooted_repo: RootedPath,
     caplog: pytest.LogCaptureFixture,
 ) -> None:
-    repo = git.Repo(rooted_tmp_path_repo)
+    repo = git.Repo(clean_rooted_repo)
 
-    app_dir = rooted_tmp_path_repo.join_within_root(subpath)
+    app_dir = clean_rooted_repo.join_within_root(subpath)
     os.makedirs(app_dir, exist_ok=True)
 
     write_file_tree(vendor_before, app_dir)
@@ -1625,15 +1632,43 @@ def test_vendor_changed(
     repo.index.commit("before vendoring", skip_hooks=True)
 
     write_file_tree(vendor_changes, app_dir, exist_ok=True)
+    index_before = Path(repo.index.path).read_bytes()
 
     assert _vendor_changed(app_dir) == bool(expected_change)
+    # not even a refresh of the index stat data
+    assert Path(repo.index.path).read_bytes() == index_before
     if expected_change:
         assert expected_change.format(subpath=subpath) in caplog.text
 
-    # The _vendor_changed function should reset the `git add` => added files should not be tracked
+    # The _vendor_changed function should not touch the index => added files should not be tracked
     assert not repo.git.diff("--diff-filter", "A")
 
 
+def test_vendor_changed_ignores_staged_changes(
+    clean_rooted_repo: RootedPath, caplog: pytest.LogCaptureFixture
+) -> None:
+    repo = git.Repo(clean_rooted_repo)
+
+    write_file_tree({"vendor": {"modules.txt": "foo v1.0.0\n"}}, clean_rooted_repo)
+    repo.index.add(["vendor/modules.txt"])
+    repo.index.commit("before vendoring", skip_hooks=True)
+
+    # the changes are staged, the working tree matches the index
+    write_file_tree(
+        {"vendor": {"modules.txt": "foo v2.0.0\n", "some_file": "foo"}},
+        clean_rooted_repo,
+        exist_ok=True,
+    )
+    repo.git.mv("vendor/modules.txt", "vendor/renamed.txt")
+    repo.git.add("vendor")
+    assert not _vendor_changed(clean_rooted_repo)
+
+    # only the differences between the working tree and the index are reported
+    clean_rooted_repo.join_within_root("vendor/some_file").path.write_text("bar")
+    assert _vendor_changed(clean_rooted_repo)
+    assert "vendor directory changed after vendoring:\nM\tvendor/some_file" in caplog.text
+
+
 @pytest.mark.parametrize(
     "file_tree",
     (
@@ -1843,7 +1878,8 @@ def test_fetch_gomod_source(
         )
         for package in gomod_request.packages
     ]
-    mock_resolve_gomod.assert_has_calls(calls)
+    # subpaths are resolved concurrently, the order of the calls is not guaranteed
+    mock_resolve_gomod.assert_has_calls(calls, any_order=True)
 
     if len(gomod_request.packages) == 0:
         expected_output = RequestOutput.empty()
@@ -1856,6 +1892,203 @@ def test_fetch_gomod_source(
     assert output == expected_output
 
 
+@pytest.mark.parametrize(
+    "gomod_input_packages",
+    [[{"type": "gomod", "path": "."}, {"type": "gomod", "path": "./path"}]],
+)
+@mock.patch("hermeto.core.package_managers.gomod._get_repository_name")
+@mock.patch("hermeto.core.package_managers.gomod._find_missing_gomod_files")
+@mock.patch("hermeto.core.package_managers.gomod._resolve_gomod")
+@mock.patch("hermeto.core.package_managers.gomod.GoCacheTemporaryDirectory")
+@mock.patch("hermeto.core.package_managers.gomod.ModuleVersionResolver.from_repo_path")
+@mock.patch("hermeto.core.package_managers.gomod.GoWork")
+def test_fetch_gomod_source_failure(
+    mock_go_work: mock.Mock,
+    mock_version_resolver: mock.Mock,
+    mock_tmp_dir: mock.Mock,
+    mock_resolve_gomod: mock.Mock,
+    mock_find_missing_gomod_files: mock.Mock,
+    mock_get_repository_name: mock.Mock,
+    gomod_request: Request,
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    def resolve_gomod_mocked(app_dir: RootedPath, *args: Any) -> ResolvedGoModule:
+        if app_dir.path.name == "path":
+            raise PackageManagerError("go mod download failed")
+        return ResolvedGoModule(
+            ParsedModule(path="github.com/my-org/my-repo", version="v1.0.0"), [], [], frozenset()
+        )
+
+    mock_resolve_gomod.side_effect = resolve_gomod_mocked
+    mock_find_missing_gomod_files.return_value = []
+    mock_get_repository_name.return_value = "github.com/my-org/my-repo"
+
+    with pytest.raises(PackageManagerError, match="go mod download failed"):
+        fetch_gomod_source(gomod_request)
+
+    assert "Failed to fetch gomod dependencies at subpath path" in caplog.messages
+
+
+@pytest.mark.parametrize(
+    "gomod_input_packages",
+    [[{"type": "gomod", "path": "."}, {"type": "gomod", "path": "./tools"}]],
+)
+@mock.patch("hermeto.core.package_managers.gomod._get_repository_name")
+@mock.patch("hermeto.core.package_managers.gomod._find_missing_gomod_files")
+@mock.patch("hermeto.core.package_managers.gomod._resolve_gomod")
+@mock.patch("hermeto.core.package_managers.gomod.GoCacheTemporaryDirectory")
+@mock.patch("hermeto.core.package_managers.gomod.ModuleVersionResolver.from_repo_path")
+@mock.patch("hermeto.core.package_managers.gomod.GoWork")
+def test_fetch_gomod_source_nested_subpaths(
+    mock_go_work: mock.Mock,
+    mock_version_resolver: mock.Mock,
+    mock_tmp_dir: mock.Mock,
+    mock_resolve_gomod: mock.Mock,
+    mock_find_missing_gomod_files: mock.Mock,
+    mock_get_repository_name: mock.Mock,
+    gomod_request: Request,
+) -> None:
+    def resolve_gomod_mocked(app_dir: RootedPath, *args: Any) -> ResolvedGoModule:
+        return ResolvedGoModule(
+            ParsedModule(path=f"github.com/my-org/{app_dir.path.name}", version="v1.0.0"),
+            [],
+            [],
+            frozenset(),
+        )
+
+    mock_resolve_gomod.side_effect = resolve_gomod_mocked
+    mock_find_missing_gomod_files.return_value = []
+    mock_get_repository_name.return_value = "github.com/my-org/my-repo"
+
+    with mock.patch(
+        "hermeto.core.package_managers.gomod._protect_against_symlinks"
+    ) as mock_protect_against_symlinks:
+        # The check of "." walks the "tools" tree as well. All the trees must be checked before
+        # any module gets resolved, vendoring "tools" would rewrite its tree during the walk.
+        mock_protect_against_symlinks.side_effect = (
+            lambda app_dir: mock_resolve_gomod.assert_not_called()
+        )
+        fetch_gomod_source(gomod_request)
+
+    assert mock_protect_against_symlinks.call_args_list == [
+        mock.call(gomod_request.source_dir),
+        mock.call(gomod_request.source_dir.join_within_root("tools")),
+    ]
+    assert mock_resolve_gomod.call_count == 2
+
+
+@pytest.mark.parametrize(
+    "gomod_input_packages",
+    [[{"type": "gomod", "path": "."}, {"type": "gomod", "path": "./tools"}]],
+)
+@mock.patch("hermeto.core.package_managers.gomod._get_repository_name")
+@mock.patch("hermeto.core.package_managers.gomod._find_missing_gomod_files")
+@mock.patch("hermeto.core.package_managers.gomod._resolve_gomod")
+@mock.patch("hermeto.core.package_managers.gomod.ModuleVersionResolver.from_repo_path")
+def test_fetch_gomod_source_nested_suspicious_symlink(
+    mock_version_resolver: mock.Mock,
+    mock_resolve_gomod: mock.Mock,
+    mock_find_missing_gomod_files: mock.Mock,
+    mock_get_repository_name: mock.Mock,
+    gomod_request: Request,
+) -> None:
+    mock_find_missing_gomod_files.return_value = []
+    gomod_request.source_dir.path.joinpath("tools/vendor").mkdir(parents=True)
+    gomod_request.source_dir.path.joinpath("tools/vendor/main.go").symlink_to("/foo")
+
+    with pytest.raises(PathOutsideRoot):
+        fetch_gomod_source(gomod_request)
+
+    mock_resolve_gomod.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "existing_tree, expected_files",
+    [
+        pytest.param(
+            {},
+            {"foo/@v/v1.0.0.zip": "foo", "foo/@v/list": "v1.0.0\n"},
+            id="empty_output_dir",
+        ),
+        pytest.param(
+            {"bar": {"@v": {"v2.0.0.zip": "bar"}}},
+            {"foo/@v/v1.0.0.zip": "foo", "foo/@v/list": "v1.0.0\n", "bar/@v/v2.0.0.zip": "bar"},
+            id="merge_with_existing_output",
+        ),
+        pytest.param(
+            {"foo": {"@v": {"v1.0.0.zip": "existing foo"}}},
+            {"foo/@v/v1.0.0.zip": "existing foo", "foo/@v/list": "v1.0.0\n"},
+            id="keep_existing_files",
+        ),
+        pytest.param(
+            {"foo": {"@v": {"v0.1.0.zip": "old foo", "list": "v0.1.0\nv1.0.0\n\n"}}},
+            {
+                "foo/@v/v0.1.0.zip": "old foo",
+                "foo/@v/v1.0.0.zip": "foo",
+                "foo/@v/list": "v0.1.0\nv1.0.0\n",
+            },
+            id="merge_version_lists",
+        ),
+        pytest.param(
+            {"foo": {"@v": {"v2.0.0.zip": "new foo", "list": "v2.0.0"}}},
+            {
+                "foo/@v/v1.0.0.zip": "foo",
+                "foo/@v/v2.0.0.zip": "new foo",
+                "foo/@v/list": "v2.0.0\nv1.0.0\n",
+            },
+            id="merge_version_lists_no_trailing_newline",
+        ),
+    ],
+)
+def test_add_downloaded_dependencies(
+    existing_tree: dict[str, Any], expected_files: dict[str, str], tmp_path: Path
+) -> None:
+    download_cache_dir = tmp_path / "tmp-cache/pkg/mod/cache/download"
+    download_cache_dir.mkdir(parents=True)
+    write_file_tree({"foo": {"@v": {"v1.0.0.zip": "foo", "list": "v1.0.0\n"}}}, download_cache_dir)
+
+    gomod_download_dir = tmp_path / "output/deps/gomod/pkg/mod/cache/download"
+    gomod_download_dir.mkdir(parents=True)
+    write_file_tree(existing_tree, gomod_download_dir)
+
+    _add_downloaded_dependencies(download_cache_dir, gomod_download_dir)
+
+    output_files = {
+        path.relative_to(gomod_download_dir).as_posix(): path.read_text()
+        for path in gomod_download_dir.rglob("*")
+        if path.is_file()
+    }
+    assert output_files == expected_files
+
+
+@pytest.mark.parametrize("link_fails", [False, True])
+def test_link_or_copy(link_fails: bool, tmp_path: Path) -> None:
+    src = tmp_path / "src"
+    dst = tmp_path / "dst"
+    src.write_text("foo")
+
+    if link_fails:
+        with mock.patch("os.link", side_effect=OSError("Invalid cross-device link")):
+            _link_or_copy(str(src), str(dst))
+    else:
+        _link_or_copy(str(src), str(dst))
+
+    assert dst.read_text() == "foo"
+    assert os.path.samefile(src, dst) is not link_fails
+
+
+def test_go_cache_temporary_directory_cleanup() -> None:
+    with GoCacheTemporaryDirectory() as tmp_dir:
+        # mimic the read-only files and directories of the Go module cache
+        module_dir = Path(tmp_dir, "pkg/mod/example.com/foo@v1.0.0")
+        module_dir.mkdir(parents=True)
+        module_dir.joinpath("foo.go").write_text("package foo")
+        module_dir.joinpath("foo.go").chmod(0o444)
+        module_dir.chmod(0o555)
+
+    assert not Path(tmp_dir).exists()
+
+
 @pytest.mark.parametrize(
     "input_url",
     (
@@ -1897,13 +2130,11 @@ def repo_remote_with_tag(rooted_tmp_path: RootedPath) -> tuple[RootedPath, Roote
     remote_repo_path.path.mkdir()
     remote_repo = git.Repo.init(remote_repo_path)
 
-    with open(readme_file_path, "wb"):
-        pass
+    readme_file_path.path.write_text("")
     remote_repo.index.add([readme_file_path])
     initial_commit = remote_repo.index.commit("Add README")
 
-    with open(readme_file_path, "w") as f:
-        f.write("This is a README")
+    readme_file_path.path.write_text("This is a README")
     remote_repo.index.add([readme_file_path])
     remote_repo.index.commit("Update README")
 
@@ -2183,17 +2414,18 @@ class TestGo:
     )
     @mock.patch("hermeto.core.package_managers.gomod.get_config")
     @mock.patch("hermeto.core.package_managers.gomod.run_cmd")
-    @mock.patch("time.sleep")
     def test_retry(
         self,
-        mock_sleep: mock.Mock,
         mock_run: mock.Mock,
         mock_config: mock.Mock,
         bin_: str,
         params: dict,
         tries_needed: int,
+        monkeypatch: pytest.MonkeyPatch,
         caplog: pytest.LogCaptureFixture,
     ) -> None:
+        sleeps: list[float] = []
+        monkeypatch.setattr("time.sleep", sleeps.append)
         mock_config.return_value.gomod_download_max_tries = 5
 
         # We don't want to mock subprocess.run here, because:
@@ -2212,14 +2444,19 @@ class TestGo:
         go._retry(cmd, **params)
         mock_run.assert_called_with(cmd, params)
         assert mock_run.call_count == tries_needed
-        assert mock_sleep.call_count == tries_needed - 1
+        assert len(sleeps) == tries_needed - 1
 
     @mock.patch("hermeto.core.package_managers.gomod.get_config")
     @mock.patch("hermeto.core.package_managers.gomod.run_cmd")
-    @mock.patch("time.sleep")
     def test_retry_failure(
-        self, mock_sleep: Any, mock_run: Any, mock_config: Any, caplog: pytest.LogCaptureFixture
+        self,
+        mock_run: Any,
+        mock_config: Any,
+        monkeypatch: pytest.MonkeyPatch,
+        caplog: pytest.LogCaptureFixture,
     ) -> None:
+        sleeps: list[float] = []
+        monkeypatch.setattr("time.sleep", sleeps.append)
         mock_config.return_value.gomod_download_max_tries = 5
 
         failure = subprocess.CalledProcessError(returncode=1, cmd="foo")
@@ -2232,7 +2469,7 @@ class TestGo:
             go._retry([go._bin, "mod", "download"])
 
         assert mock_run.call_count == 5
-        assert mock_sleep.call_count == 4
+        assert len(sleeps) == 4
 
     @pytest.mark.parametrize("release", ["go1.20", "go1.21.1"])
     @mock.patch("pathlib.Path.home")